@@ -1,15 +1,24 @@
 import os
+import asyncio
 import streamlit as st
 import logging
-from typing import Dict, Any
+import queue
+import textwrap
+import threading
+from string import Template
+from typing import Dict, Any, List, Callable
 from langchain_together import ChatTogether
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langgraph.constants import Send
-from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.messages import HumanMessage, SystemMessage
 from langgraph.graph import StateGraph, START, END
+from langchain_community.cache import SQLiteCache
+from langchain_core.caches import BaseCache
+from langchain_core.globals import get_llm_cache, set_llm_cache
+from langchain_core.utils.json import parse_partial_json
 
-from state import GraphState, ContentInsight, GeneratedLinkedinPost, SelectedBestPost
-from utils import fetch_website_content
+from state import GraphState, ContentInsight, ContentInsightBatch, GeneratedLinkedinPost, SelectedBestPost
+from utils import fetch_websites_content
 
 logger = logging.getLogger(__name__)
 
@@ -21,26 +30,186 @@ os.environ["LANGCHAIN_API_KEY"] = st.secrets["LANGCHAIN_API_KEY"]["API_KEY"]
 os.environ["LANGCHAIN_ENDPOINT"]="https://api.smith.langchain.com"
 os.environ["LANGCHAIN_PROJECT"] = "Linkedin Post Generator"
 
-# Initialize the language model
-def create_workflow() -> StateGraph:
-    """Create and configure the workflow graph"""
-    # Initialize LLM
-    llm_together = ChatTogether(
-        model="meta-llama/Llama-3.3-70B-Instruct-Turbo-Free",
-        api_key = os.environ["TOGETHER_API_KEY"],
-        temperature=0.7,
-        timeout=120,
-        max_retries=2
-    )
+# Cache LLM responses on disk so repeated generations with the same inputs skip the API call
+set_llm_cache(SQLiteCache(database_path=".llm_cache.db"))
+
+# Cap the content sent to the LLMs; gpt-4o's tokenizer approximates Gemini/Llama token counts
+_MAX_CONTENT_TOKENS = 4000
+_CHARS_PER_TOKEN = 4
+
+_ENCODER_LOAD_TIMEOUT = 10
+
+# The tokenizer is loaded at most once per process, in the background: tiktoken downloads
+# its encoding file on first use with no timeout, and a failed load must not be retried
+# (or block) on every run
+_ENCODER = None
+_ENCODER_LOADER = None
+_ENCODER_LOCK = threading.Lock()
+
+def _load_encoder():
+    """Load the gpt-4o tokenizer into _ENCODER"""
+    global _ENCODER
+    try:
+        import tiktoken
+        _ENCODER = tiktoken.encoding_for_model("gpt-4o")
+    except Exception as e:
+        logger.warning(f"Tokenizer unavailable, truncating by characters: {str(e)}")
+
+def _get_encoder():
+    """Return the tokenizer, or None while it is still loading or if loading failed"""
+    global _ENCODER_LOADER
+    with _ENCODER_LOCK:
+        started = _ENCODER_LOADER is None
+        if started:
+            _ENCODER_LOADER = threading.Thread(target=_load_encoder, name="tiktoken-load", daemon=True)
+            _ENCODER_LOADER.start()
+
+    # Only the first caller waits for the load, and only briefly
+    if started:
+        _ENCODER_LOADER.join(timeout=_ENCODER_LOAD_TIMEOUT)
+    return _ENCODER
+
+def _truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Trim text to at most max_tokens, approximating by characters if the tokenizer is unavailable"""
+    encoder = _get_encoder()
+    if encoder is None:
+        return text[:max_tokens * _CHARS_PER_TOKEN]
+
+    tokens = encoder.encode(text)
+    if len(tokens) > max_tokens:
+        return encoder.decode(tokens[:max_tokens])
+    return text
+
+# Initialize the language models once per process
+_LLM_TOGETHER = ChatTogether(
+    model="meta-llama/Llama-3.3-70B-Instruct-Turbo-Free",
+    api_key = os.environ["TOGETHER_API_KEY"],
+    temperature=0.7,
+    timeout=120,
+    max_retries=2
+)
+
+_LLM_GEMINI = ChatGoogleGenerativeAI(
+    model="gemini-2.0-flash-exp",
+    google_api_key = os.environ["GOOLGE_API_KEY"],  
+    temperature=0.7,
+    timeout=120,
+    max_retries=2
+)
+
+# Bind the structured output schemas once instead of on every node call
+_INSIGHT_LLM = _LLM_GEMINI.with_structured_output(ContentInsightBatch)
+_POST_LLM = _LLM_TOGETHER.with_structured_output(GeneratedLinkedinPost)
+_SELECTOR_LLM = _LLM_TOGETHER.with_structured_output(SelectedBestPost)
+
+class _RefreshCache(BaseCache):
+    """Skip cache lookups but still write responses to the global LLM cache"""
+
+    def lookup(self, prompt, llm_string):
+        return None
+
+    def update(self, prompt, llm_string, return_val):
+        cache = get_llm_cache()
+        if cache is not None:
+            cache.update(prompt, llm_string, return_val)
+
+    def clear(self, **kwargs):
+        pass
+
+# Variants used by "Regenerate": they always call the model, then overwrite the cached
+# responses so a later "Generate" with the same inputs returns the fresh drafts
+_INSIGHT_LLM_FRESH = _LLM_GEMINI.model_copy(update={"cache": _RefreshCache()}).with_structured_output(ContentInsightBatch)
+_POST_LLM_FRESH = _LLM_TOGETHER.model_copy(update={"cache": _RefreshCache()}).with_structured_output(GeneratedLinkedinPost)
+
+# Per-provider caps on concurrent LLM calls; Together and Gemini quotas are independent.
+# Every run executes on the one shared workflow event loop, so these limit all sessions
+# together. Rate-limit retries are left to the clients' own max_retries backoff.
+_TOGETHER_SEMAPHORE = asyncio.Semaphore(int(os.getenv("TOGETHER_MAX_CONCURRENCY", "5")))
+_GEMINI_SEMAPHORE = asyncio.Semaphore(int(os.getenv("GEMINI_MAX_CONCURRENCY", "5")))
+
+async def _ainvoke_together(structured_llm, messages):
+    """Call a Together-backed LLM within the process-wide concurrency cap"""
+    async with _TOGETHER_SEMAPHORE:
+        return await structured_llm.ainvoke(messages)
+
+# Prompt templates, dedented once at import so no indentation is sent to the LLMs.
+# Static instructions come first so the prefix is shared across calls.
+_INSIGHT_TEMPLATE = Template(textwrap.dedent("""\
+    You are a creative content strategist. Generate three unique content insights from different angle for creating LinkedIn post, based on the content source below.
+
+    Format your response as a list of three insights, each with:
+    1. A creative TITLE (max 10 words)
+    2. A DESCRIPTION (1-2 sentences explaining the insight)
+    3. AUDIENCE RELEVANCE (1-2 sentences explaining how this insight specifically connects with the target audience)
+    4. VALUE ALIGNMENT (1-2 sentences explaining how this insight aligns with value proposition)
+
+    Target Audience: $target_audience
+    Value Proposition: $value_proposition
+
+    Content Source:
+    $content"""))
+
+_INSIGHT_REQUEST = "Generate three distinct insights, each from a unique angle, and do not repeat the same idea across insights."
+
+_POST_TEMPLATE = Template(textwrap.dedent("""\
+    Generate a compelling LinkedIn post based on the insight provided by the user.
+
+    Craft a LinkedIn post with:
+    1. An attention-grabbing TITLE
+    2. A strong HOOK that immediately engages the reader
+    3. A substantive BODY that provides real value
+    4. A clear CALL TO ACTION
+    5. Relevant HASHTAGS to increase post visibility
+
+    Post Generation Guidelines:
+    - Tone: $tone
+    - Target Audience: $target_audience
+    - Value Proposition: $value_proposition
+    - Brand Persona: $brand_persona"""))
+
+_POST_INSIGHT_TEMPLATE = Template(textwrap.dedent("""\
+    Insight Title: $title
+    Insight Description: $description
+    Audience Relevance: $audience_relevance
+    Value Alignment: $value_alignment"""))
 
-    llm_gemini = ChatGoogleGenerativeAI(
-        model="gemini-2.0-flash-exp",
-        google_api_key = os.environ["GOOLGE_API_KEY"],  
-        temperature=0.7,
-        timeout=120,
-        max_retries=2
+_SELECTION_TEMPLATE = Template(textwrap.dedent("""\
+    From the following generated LinkedIn posts, select the BEST post based on:
+    1. Engagement potential
+    2. Alignment with target audience
+    3. Clarity of message
+    4. Uniqueness of insight
+
+    Generated Posts (id. title — hook):
+    $posts
+
+    Return the id (1-$count) of the best post and a short reason for choosing it in terms of the criteria above."""))
+
+def _generate_insights(content: str, target_audience: str, value_proposition: str, insight_llm) -> List[ContentInsight]:
+    """Generate three content insights with the given structured LLM"""
+    system_prompt = _INSIGHT_TEMPLATE.substitute(
+        content=content,
+        target_audience=target_audience,
+        value_proposition=value_proposition
     )
 
+    insights = insight_llm.invoke([
+        SystemMessage(content=system_prompt),
+        HumanMessage(content=_INSIGHT_REQUEST)
+    ]).insights[:3]
+
+    # Raise instead of returning a short list so Streamlit doesn't cache it
+    if len(insights) < 3:
+        raise ValueError(f"Expected 3 insights, got {len(insights)}")
+    return insights
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def insights_for(content: str, target_audience: str, value_proposition: str, model: str, _insight_llm=_INSIGHT_LLM) -> List[ContentInsight]:
+    """Generate content insights, memoized on the inputs and the model name"""
+    return _generate_insights(content, target_audience, value_proposition, _insight_llm)
+
+def create_workflow() -> StateGraph:
+    """Create and configure the workflow graph"""
     def get_website_content(state: GraphState) -> GraphState:
         """Node: Fetch website content"""
         website_url = state.get('website_url')
@@ -49,59 +218,54 @@ def create_workflow() -> StateGraph:
         content = []
         
         if website_url:
-            web_content = fetch_website_content(website_url)
-            if web_content:
-                content.append(web_content)
+            urls = [website_url] if isinstance(website_url, str) else website_url
+            web_content = fetch_websites_content(urls)
+            if len(web_content) < len(urls):
+                logger.warning(f"Fetched content for {len(web_content)} of {len(urls)} website URLs")
+            content.extend(web_content)
                 
         if given_content:
             content.append(given_content)
             
-        state["website_content"] = "\n\n".join(content) if content else ""
+        joined = "\n\n".join(content).strip() if content else ""
+        state["website_content"] = _truncate_to_tokens(joined, _MAX_CONTENT_TOKENS)
         return state
 
-    def generate_content_insights(state: GraphState) -> GraphState:
+    async def generate_content_insights(state: GraphState) -> GraphState:
         """Node: Generate content insights"""
         content = state.get('website_content', '')
         target_audience = state['target_audience']
         value_proposition = state['value_proposition']
+        regenerate = state.get('regenerate', False)
 
-        insights = []
-        
-        for i in range(3):  # Generate 3 distinct insights
-            prompt = f"""You are a creative content strategist. Generate three unique content insights from different angle for creating LinkedIn post, based on:
-
-            Content Source:
-            {content}
-
-            Target Audience: {target_audience}
-            Value Proposition: {value_proposition}
-
-            Format your response as a single insight with:
-            1. A creative TITLE (max 10 words)
-            2. A DESCRIPTION (1-2 sentences explaining the insight)
-            3. AUDIENCE RELEVANCE (1-2 sentences explaining how this insight specifically connects with the target audience)
-            4. VALUE ALIGNMENT (1-2 sentences explaining how this insight aligns with value proposition)
-
-            This should be insight #{i+1} of 3, make sure it's from unique angle and different from other insights, and do not repeat any previous insights.
-            """
-
-            try:
-                structured_llm = llm_gemini.with_structured_output(ContentInsight)
-                insight = structured_llm.invoke([HumanMessage(content=prompt)])
-                insights.append(insight)
-            except Exception as e:
-                logger.error(f"Error generating insight {i+1}: {str(e)}")
-                # Create a fallback insight
-                fallback_insight = ContentInsight(
-                    title=f"Insight {i+1}",
-                    description="Unable to generate insight. Please try again.",
-                    audience_relevance="N/A",
-                    value_alignment="N/A"
-                )
-                insights.append(fallback_insight)
-
-        state["content_insights"] = insights
-        return state
+        try:
+            # The insight calls are sync (insights_for is memoized), so run them off the event loop
+            async with _GEMINI_SEMAPHORE:
+                if regenerate:
+                    # Drop the memoized entry and refill it with fresh insights
+                    insights_for.clear(content, target_audience, value_proposition, _LLM_GEMINI.model)
+                    insights = await asyncio.to_thread(
+                        insights_for, content, target_audience, value_proposition, _LLM_GEMINI.model,
+                        _INSIGHT_LLM_FRESH
+                    )
+                else:
+                    insights = await asyncio.to_thread(
+                        insights_for, content, target_audience, value_proposition, _LLM_GEMINI.model
+                    )
+        except Exception as e:
+            logger.error(f"Error generating insights: {str(e)}")
+            insights = []
+
+        # Fill with fallback insights if generation failed
+        for i in range(len(insights), 3):
+            insights.append(ContentInsight(
+                title=f"Insight {i+1}",
+                description="Unable to generate insight. Please try again.",
+                audience_relevance="N/A",
+                value_alignment="N/A"
+            ))
+
+        return {"content_insights": insights}
 
     def generate_linkedin_posts(state: GraphState) -> GraphState:
         """Node: Generate LinkedIn posts"""
@@ -110,6 +274,7 @@ def create_workflow() -> StateGraph:
         target_audience = state['target_audience']
         value_proposition = state['value_proposition']
         brand_persona = state['brand_persona']
+        regenerate = state.get('regenerate', False)
 
         # Use Send to create parallel branches for generating LinkedIn posts
         return [
@@ -118,50 +283,53 @@ def create_workflow() -> StateGraph:
                 "tone": tone,
                 "target_audience": target_audience,
                 "value_proposition": value_proposition,
-                "brand_persona": brand_persona
+                "brand_persona": brand_persona,
+                "regenerate": regenerate
             }) 
             for insight in content_insights
         ]
 
-    def generate_single_post(state: GraphState) -> GraphState:
+    async def generate_single_post(state: GraphState) -> GraphState:
         """Node: Generate a single LinkedIn post"""
         insight = state['insight']
         tone = state['tone']
         target_audience = state['target_audience']
         value_proposition = state['value_proposition']
         brand_persona = state['brand_persona']
+        post_llm = _POST_LLM_FRESH if state.get('regenerate', False) else _POST_LLM
 
         # Construct the prompt
-        prompt = f"""Generate a compelling LinkedIn post based on the following insight:
-
-        Insight Title: {insight.title}
-        Insight Description: {insight.description}
-        Audience Relevance: {insight.audience_relevance}
-        Value Alignment: {insight.value_alignment}
-
-        Post Generation Guidelines:
-        - Tone: {tone}
-        - Target Audience: {target_audience}
-        - Value Proposition: {value_proposition}
-        - Brand Persona: {brand_persona}
-
-        Craft a LinkedIn post with:
-        1. An attention-grabbing TITLE
-        2. A strong HOOK that immediately engages the reader
-        3. A substantive BODY that provides real value
-        4. A clear CALL TO ACTION
-        5. Relevant HASHTAGS to increase post visibility
-        """
+        system_prompt = _POST_TEMPLATE.substitute(
+            tone=tone,
+            target_audience=target_audience,
+            value_proposition=value_proposition,
+            brand_persona=brand_persona
+        )
+        prompt = _POST_INSIGHT_TEMPLATE.substitute(
+            title=insight.title,
+            description=insight.description,
+            audience_relevance=insight.audience_relevance,
+            value_alignment=insight.value_alignment
+        )
 
         try:
-            structured_llm = llm_together.with_structured_output(GeneratedLinkedinPost)
-            post = structured_llm.invoke([HumanMessage(content=prompt)])
-            return {"linkedin_posts": [post]}
+            post = await _ainvoke_together(post_llm, [
+                SystemMessage(content=system_prompt),
+                HumanMessage(content=prompt)
+            ])
         except Exception as e:
             logger.error(f"Error generating LinkedIn post: {str(e)}")
-            raise
+            # Create a fallback post so the other branches still complete
+            post = GeneratedLinkedinPost(
+                title=insight.title,
+                hook="Unable to generate post. Please try again.",
+                body="N/A",
+                call_to_action="N/A"
+            )
+
+        return {"linkedin_posts": [post]}
         
-    def select_best_post(state: GraphState):
+    async def select_best_post(state: GraphState):
         """Reducer node: Select the best LinkedIn post"""
         linkedin_posts = state.get('linkedin_posts', [])
         
@@ -170,42 +338,28 @@ def create_workflow() -> StateGraph:
             return state
 
         # Use an LLM to select the best post based on specific criteria
-        selection_prompt = f"""
-        From the following generated LinkedIn posts, select the BEST post based on:
-        1. Engagement potential
-        2. Alignment with target audience
-        3. Clarity of message
-        4. Uniqueness of insight
-
-        Generated Posts:
-        {chr(10).join([f"Post {i+1}: {post.title} {post.hook} {post.body} {post.call_to_action}Hashtags: {', '.join(post.hashtags) if post.hashtags else 'None'}" for i, post in enumerate(linkedin_posts)])}
-
-        Provide a detailed explanation for your selection, explaining why the chosen post is the best in terms of the criteria mentioned above.
-        """
+        selection_prompt = _SELECTION_TEMPLATE.substitute(
+            posts="\n".join(f"{i+1}. {post.title} — {post.hook}" for i, post in enumerate(linkedin_posts)),
+            count=len(linkedin_posts)
+        )
 
         try:
             # Use a structured output to select the best post
-            best_post_selector = llm_together.with_structured_output(SelectedBestPost)
-            best_post = best_post_selector.invoke([
-                HumanMessage(content=selection_prompt),
-                *[AIMessage(content=f"Post {i+1}:\nTitle: {post.title}\nHook: {post.hook}\nBody: {post.body}\nCall to Action: {post.call_to_action}\nHashtags: {', '.join(post.hashtags) if post.hashtags else 'None'}") for i, post in enumerate(linkedin_posts)]
-            ])
+            best_post = await _ainvoke_together(_SELECTOR_LLM, [HumanMessage(content=selection_prompt)])
+            if not 1 <= best_post.id <= len(linkedin_posts):
+                raise ValueError(f"Selected post id {best_post.id} is out of range")
 
-            # Update the state with the best selected post
-            return {
-                "best_selected": best_post,
-                "linkedin_posts": linkedin_posts  # Keep all posts for reference
-            }
+            # Update the state with the best selected post; linkedin_posts is a reducer
+            # channel, so returning it again would append a duplicate of every post
+            return {"best_selected": best_post}
         except Exception as e:
             logger.error(f"Error selecting best post: {str(e)}")
             # Fallback to selecting the first post if there's an error
             return {
                 "best_selected": SelectedBestPost(
                     id=1,
-                    Title=linkedin_posts[[0]].title if linkedin_posts else "No Title",
                     reason="Default selection due to error in best post selection"
-                    ),
-                "linkedin_posts": linkedin_posts
+                    )
             }
     
     
@@ -227,11 +381,79 @@ def create_workflow() -> StateGraph:
 
     return workflow.compile()
 
-def run_workflow(inputs: Dict[str, Any]) -> Dict[str, Any]:
-    """Run the workflow with the given inputs"""
+@st.cache_resource(show_spinner=False)
+def _get_workflow():
+    """Compile the workflow graph once per process"""
+    return create_workflow()
+
+# The async LLM clients and the semaphores above are module globals bound to the loop
+# that first uses them, so the loop is a module-level singleton too. It is deliberately
+# not a Streamlit cache: "Clear cache" would otherwise start a second loop.
+_EVENT_LOOP = None
+_EVENT_LOOP_LOCK = threading.Lock()
+
+def _get_event_loop() -> asyncio.AbstractEventLoop:
+    """Start one long-lived event loop for all workflow runs"""
+    global _EVENT_LOOP
+    with _EVENT_LOOP_LOCK:
+        if _EVENT_LOOP is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="workflow-event-loop", daemon=True).start()
+            _EVENT_LOOP = loop
+        return _EVENT_LOOP
+
+def _chunk_text(chunk) -> str:
+    """Extract streamed text from a message chunk, including partial tool call JSON"""
+    if isinstance(chunk.content, str) and chunk.content:
+        return chunk.content
+    return "".join(tool_call.get("args") or "" for tool_call in getattr(chunk, "tool_call_chunks", []))
+
+def _parse_post_draft(raw: str) -> Dict[str, Any]:
+    """Parse the structured-output JSON streamed so far for a post into its partial fields"""
+    try:
+        draft = parse_partial_json(raw)
+    except ValueError:
+        return {}
+    return draft if isinstance(draft, dict) else {}
+
+async def stream_workflow_async(inputs: Dict[str, Any], on_post_draft: Callable[[str, Dict[str, Any]], None]) -> Dict[str, Any]:
+    """Run the workflow, passing each post branch's partial fields to on_post_draft, and return the final state"""
+    result = None
+    raw_drafts = {}
     try:
-        workflow = create_workflow()
-        return workflow.invoke(inputs)
+        async for event in _get_workflow().astream_events(inputs, version="v2"):
+            if event["event"] == "on_chat_model_stream" and event["metadata"].get("langgraph_node") == "generate_single_post":
+                # Each Send branch runs under its own checkpoint namespace
+                branch = event["metadata"]["langgraph_checkpoint_ns"]
+                text = _chunk_text(event["data"]["chunk"])
+                if text:
+                    raw_drafts[branch] = raw_drafts.get(branch, "") + text
+                    draft = _parse_post_draft(raw_drafts[branch])
+                    if draft:
+                        on_post_draft(branch, draft)
+            elif event["event"] == "on_chain_end" and not event["parent_ids"]:
+                result = event["data"]["output"]
+        return result
     except Exception as e:
         logger.error(f"Error running workflow: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+
+def stream_workflow(inputs: Dict[str, Any], on_post_draft: Callable[[str, Dict[str, Any]], None]) -> Dict[str, Any]:
+    """Stream the workflow on the shared event loop, calling on_post_draft from the caller's thread"""
+    # Streamlit elements can only be updated from the script thread, so drafts are
+    # handed back through a queue instead of calling on_post_draft on the loop thread
+    drafts = queue.Queue()
+    future = asyncio.run_coroutine_threadsafe(
+        stream_workflow_async(inputs, lambda branch, draft: drafts.put((branch, draft))),
+        _get_event_loop()
+    )
+    future.add_done_callback(lambda _: drafts.put(None))
+
+    try:
+        while (update := drafts.get()) is not None:
+            on_post_draft(*update)
+    finally:
+        # A Streamlit rerun or stop raises inside on_post_draft; cancel the run so
+        # it does not keep holding semaphore slots and calling the LLMs
+        future.cancel()
+    return future.result()
\ No newline at end of file
@@ -11,6 +11,10 @@ class ContentInsight(BaseModel):
     audience_relevance: str = Field(..., description="How the insight relates to the target audience")
     value_alignment: str = Field(..., description="How the insight aligns with the value proposition")
 
+class ContentInsightBatch(BaseModel):
+    """Structured representation of the three content insights generated in one call"""
+    insights: List[ContentInsight] = Field(..., description="Three distinct content insights, each from a different angle")
+
 class GeneratedLinkedinPost(BaseModel):
     """Structured representation of a generated LinkedIn post"""
     title: str = Field(..., description="Attention-grabbing title for the LinkedIn post")
@@ -23,20 +27,20 @@ class GeneratedLinkedinPost(BaseModel):
     )
 
 class SelectedBestPost(BaseModel):
-    """Structured representation of a best practice"""
-    id: int = Field(..., description="Unique identifier of the best practice")
-    Title: str = Field(..., description="Title of the best practice")
-    reason: str = Field(..., description="Explanation of why the best practice is important")
+    """Structured representation of the best selected post"""
+    id: int = Field(..., description="Id (1-based position) of the best post")
+    reason: str = Field(..., description="Short explanation of why this post is the best")
 
 class GraphState(TypedDict):
     """Graph state for the LinkedIn post generator workflow"""
     messages: Annotated[Sequence[HumanMessage | AIMessage], add_messages]
-    website_url: str
+    website_url: str | List[str]
     given_content: str
     tone: str
     target_audience: str
     value_proposition: str
     brand_persona: str
+    regenerate: bool
     website_content: List[str]
     insight: ContentInsight
     content_insights: List[ContentInsight]
@@ -1,7 +1,7 @@
 import os
 import streamlit as st
 from typing import Dict, Any
-from main import run_workflow
+from main import stream_workflow
 from utils import check_password, save_feedback
 
 # Set the page configuration
@@ -114,8 +114,15 @@ def main():
                 height=80
             )
 
-    # Generate Button
-    if st.button("Generate Content", type="primary", disabled=st.session_state.is_generating):
+    # Generate Buttons
+    generate = st.button("Generate Content", type="primary", disabled=st.session_state.is_generating)
+    regenerate = st.button(
+        "Regenerate",
+        disabled=st.session_state.is_generating or not st.session_state.generated_content,
+        help="Write fresh drafts for the same inputs; they replace the cached ones for later runs"
+    )
+
+    if generate or regenerate:
         if not (website_url or given_content):
             st.warning("Please provide either a website URL or custom content.")
             return
@@ -136,11 +143,28 @@ def main():
                     "tone": tone,
                     "target_audience": target_audience,
                     "value_proposition": value_proposition,
-                    "brand_persona": brand_persona
+                    "brand_persona": brand_persona,
+                    "regenerate": regenerate
                 }
                 
+                # Stream each post into its own placeholder while the workflow runs
+                st.markdown("### Drafting Posts")
+                preview_columns = st.columns(3)
+                placeholders = {}
+
+                def show_post_draft(branch, draft):
+                    if branch not in placeholders:
+                        if len(placeholders) >= len(preview_columns):
+                            return
+                        placeholders[branch] = preview_columns[len(placeholders)].empty()
+                    placeholders[branch].markdown("\n\n".join(
+                        f"**{label}:** {draft[field]}"
+                        for field, label in (("title", "Title"), ("hook", "Hook"), ("body", "Body"))
+                        if isinstance(draft.get(field), str) and draft[field]
+                    ))
+
                 # Run workflow
-                result = run_workflow(inputs)
+                result = stream_workflow(inputs, show_post_draft)
 
                 if result:
                     st.session_state.generated_content = result
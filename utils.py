@@ -1,29 +1,71 @@
 import streamlit as st
-import json
-from oauth2client.service_account import ServiceAccountCredentials
-import gspread
 import hmac
 import re
+import time
 import logging
-from typing import Optional
-from langchain_community.document_loaders import WebBaseLoader
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Shared HTTP session so repeated fetches reuse pooled keep-alive connections
+_SESSION = requests.Session()
+_SESSION.headers.update({
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36",
+    "Connection": "keep-alive",
+})
+_ADAPTER = HTTPAdapter(pool_connections=10, pool_maxsize=50, max_retries=Retry(total=2, backoff_factor=0.3))
+_SESSION.mount("http://", _ADAPTER)
+_SESSION.mount("https://", _ADAPTER)
+
+_URL_REGEX = re.compile(
+    r"^(https?:\/\/)"
+    r"(www\.)?"
+    r"([a-zA-Z0-9.-]+)"
+    r"(\.[a-zA-Z]{2,})?"
+    r"(:\d+)?"
+    r"(\/[^\s]*)?$",
+    re.IGNORECASE,
+)
+
+# Google Sheet that collects user feedback
+_FEEDBACK_SCOPE = ["https://www.googleapis.com/auth/drive", "https://www.googleapis.com/auth/spreadsheets"]
+_FEEDBACK_SHEET_ID = '1qnFzZZ7YI-9pXj3iAXafjRmC_EIQyK9gA98AjMv29DM'
+
+@st.cache_resource(show_spinner=False)
+def _get_feedback_sheet():
+    """Authorize gspread once and return the feedback worksheet"""
+    # Imported lazily to keep them off the app's cold start path
+    import json
+    import gspread
+    from oauth2client.service_account import ServiceAccountCredentials
 
-# Function to save feedback to a file
-def save_feedback(feedback_text):
     # Load the credentials from the secrets
-    credentials_data = st.secrets["gcp"]["service_account_json"]
-    # print(credentials_data)
-    creds = json.loads(credentials_data, strict=False)
+    creds = json.loads(st.secrets["gcp"]["service_account_json"], strict=False)
 
     # Set up the Google Sheets API credentials
-    scope = ["https://www.googleapis.com/auth/drive", "https://www.googleapis.com/auth/spreadsheets"]
-    credentials = ServiceAccountCredentials.from_json_keyfile_dict(creds, scope)
+    credentials = ServiceAccountCredentials.from_json_keyfile_dict(creds, _FEEDBACK_SCOPE)
     client = gspread.authorize(credentials)
 
     # Open the Google Sheet
-    sheet_id = '1qnFzZZ7YI-9pXj3iAXafjRmC_EIQyK9gA98AjMv29DM'
-    sheet = client.open_by_key(sheet_id).worksheet("linkedinposts")
-    sheet.append_row([feedback_text])
+    return client.open_by_key(_FEEDBACK_SHEET_ID).worksheet("linkedinposts")
+
+# Function to save feedback to a file
+def save_feedback(feedback_text, max_retries: int = 3):
+    import gspread
+
+    for attempt in range(max_retries):
+        try:
+            _get_feedback_sheet().append_row([feedback_text])
+            return
+        except gspread.exceptions.APIError as e:
+            if attempt == max_retries - 1:
+                raise
+            logging.warning(f"Error saving feedback, retrying: {str(e)}")
+            # Drop the cached client so the next attempt re-authorizes with a fresh token
+            _get_feedback_sheet.clear()
+            time.sleep(2 ** attempt)
 
 # Password checking function
 def check_password():
@@ -59,32 +101,50 @@ def ensure_url(string: str) -> str:
     if not string.startswith(("http://", "https://")):
         string = "http://" + string
 
-    url_regex = re.compile(
-        r"^(https?:\/\/)?"
-        r"(www\.)?"
-        r"([a-zA-Z0-9.-]+)"
-        r"(\.[a-zA-Z]{2,})?"
-        r"(:\d+)?"
-        r"(\/[^\s]*)?$",
-        re.IGNORECASE,
-    )
-
-    if not url_regex.match(string):
+    if not _URL_REGEX.match(string):
         msg = f"Invalid URL: {string}"
         raise ValueError(msg)
 
     return string
 
+@st.cache_data(ttl=3600, show_spinner=False)
+def _fetch_website_text(url: str, max_length: int) -> str:
+    """Fetch and extract a website's text, raising on failure so errors are never cached"""
+    # Imported lazily to keep them off the app's cold start path
+    import trafilatura
+    from selectolax.lexbor import LexborHTMLParser
+
+    validated_url = ensure_url(url)
+    response = _SESSION.get(validated_url, timeout=10)
+    response.raise_for_status()
+    response.encoding = "utf-8"
+    html = response.text
+
+    # Prefer trafilatura's boilerplate-free extraction, fall back to all visible body text
+    text = trafilatura.extract(html)
+    if not text:
+        tree = LexborHTMLParser(html)
+        tree.strip_tags(["script", "style", "noscript", "template"])
+        text = tree.body.text(separator=" ") if tree.body else ""
+
+    text = text.strip()
+    if not text:
+        raise ValueError(f"No text content found at {validated_url}")
+    return text[:max_length]
+
 def fetch_website_content(url: str, max_length: int = 10000) -> Optional[str]:
     """Fetch and process content from a website"""
     try:
-        validated_url = ensure_url(url)
-        web_loader = WebBaseLoader(web_paths=[validated_url], encoding="utf-8")
-        text_docs = web_loader.load()
-        
-        if text_docs:
-            return text_docs[0].page_content.strip()[:max_length]
-        return None
+        return _fetch_website_text(url, max_length)
     except Exception as e:
         logging.error(f"Error fetching website content: {str(e)}")
-        return None
\ No newline at end of file
+        return None
+
+def fetch_websites_content(urls: List[str], max_length: int = 10000) -> List[str]:
+    """Fetch content from several websites concurrently, skipping failed fetches"""
+    if not urls:
+        return []
+
+    with ThreadPoolExecutor(max_workers=min(len(urls), 20)) as executor:
+        results = executor.map(lambda url: fetch_website_content(url, max_length), urls)
+        return [text for text in results if text]
\ No newline at end of file